@@ -158,6 +158,36 @@ std::vector<OpDesc *> BlockDesc::AllOps() const {
   return res;
 }
 
+std::vector<std::string> BlockDesc::CollectFreeVarNames(
+    const std::vector<std::string> &local_names, bool in_op_order) const {
+  std::unordered_set<std::string> local_inputs(local_names.begin(),
+                                               local_names.end());
+  if (!in_op_order) {
+    for (const auto &op : ops_) {
+      for (auto &out_var_name : op->OutputArgumentNames()) {
+        local_inputs.insert(out_var_name);
+      }
+    }
+  }
+
+  std::vector<std::string> free_vars;
+  std::unordered_set<std::string> free_var_set;
+  for (const auto &op : ops_) {
+    for (auto &in_var_name : op->InputArgumentNames()) {
+      if (local_inputs.count(in_var_name) == 0 &&
+          free_var_set.insert(in_var_name).second) {
+        free_vars.push_back(in_var_name);
+      }
+    }
+    if (in_op_order) {
+      for (auto &out_var_name : op->OutputArgumentNames()) {
+        local_inputs.insert(out_var_name);
+      }
+    }
+  }
+  return free_vars;
+}
+
 void BlockDesc::Flush() {
   for (auto &op_desc : ops_) {
     op_desc->Flush();
@@ -19,6 +19,7 @@ limitations under the License. */
 #include <set>
 #include <string>
 #include <unordered_map>
+#include <unordered_set>
 #include <vector>
 
 #include "paddle/fluid/framework/op_desc.h"
@@ -101,6 +102,17 @@ class BlockDesc {
 
   std::vector<OpDesc *> AllOps() const;
 
+  /*
+   * Collect the names of variables which are read by the ops in this block
+   * but are not in `local_names` and are not written by the ops, i.e. the
+   * variables captured from the enclosing blocks. Each name is returned once,
+   * in the order it is first read.
+   * If `in_op_order` is true, an output only shadows the inputs of the ops
+   * after it; otherwise every output of the block is treated as local.
+   */
+  std::vector<std::string> CollectFreeVarNames(
+      const std::vector<std::string> &local_names, bool in_op_order) const;
+
   size_t OpSize() const { return ops_.size(); }
 
   OpDesc *Op(int idx) { return ops_.at(idx).get(); }
@@ -28,32 +28,42 @@ class RNNMemoryHelperOp : public framework::OperatorBase {
  private:
   void RunImpl(const framework::Scope &scope,
                const platform::Place &dev_place) const override {
-    auto mem_var_name = Input("X");
-    auto *mem_var = scope.FindVar(mem_var_name);
-    PADDLE_ENFORCE(mem_var != nullptr,
-                   "Cannot find mem_var in scope, mem_var_name is %s",
-                   mem_var_name);
-
-    auto out_name = this->Output("Out");
-    auto *out_var = scope.FindVar(out_name);
-    PADDLE_ENFORCE(out_var != nullptr,
-                   "Cannot find out_var in scope, out_var_name is %s",
-                   out_name);
-
-    auto *out_tensor = out_var->GetMutable<framework::LoDTensor>();
-    auto &mem_tensor = mem_var->Get<framework::LoDTensor>();
-    out_tensor->ShareDataWith(mem_tensor);
-    out_tensor->set_lod(mem_tensor.lod());
+    auto &mem_var_names = Inputs("X");
+    auto &out_names = Outputs("Out");
+    PADDLE_ENFORCE_EQ(mem_var_names.size(), out_names.size(),
+                      "The number of Input(X) and Output(Out) should be equal");
+
+    for (size_t i = 0; i < mem_var_names.size(); ++i) {
+      auto *mem_var = scope.FindVar(mem_var_names[i]);
+      PADDLE_ENFORCE(mem_var != nullptr,
+                     "Cannot find mem_var in scope, mem_var_name is %s",
+                     mem_var_names[i]);
+
+      auto *out_var = scope.FindVar(out_names[i]);
+      PADDLE_ENFORCE(out_var != nullptr,
+                     "Cannot find out_var in scope, out_var_name is %s",
+                     out_names[i]);
+
+      auto *out_tensor = out_var->GetMutable<framework::LoDTensor>();
+      auto &mem_tensor = mem_var->Get<framework::LoDTensor>();
+      out_tensor->ShareDataWith(mem_tensor);
+      out_tensor->set_lod(mem_tensor.lod());
+    }
   }
 };
 
 class RNNMemoryHelperOpShapeInference : public framework::InferShapeBase {
  public:
   void operator()(framework::InferShapeContext *ctx) const override {
-    PADDLE_ENFORCE(ctx->HasInput("X"), "");
-    PADDLE_ENFORCE(ctx->HasOutput("Out"), "");
-    ctx->SetOutputDim("Out", ctx->GetInputDim("X"));
-    ctx->ShareLoD("X", /*->*/ "Out");
+    PADDLE_ENFORCE(ctx->HasInputs("X"), "");
+    PADDLE_ENFORCE(ctx->HasOutputs("Out"), "");
+    auto x_dims = ctx->GetInputsDim("X");
+    PADDLE_ENFORCE_EQ(x_dims.size(), ctx->Outputs("Out").size(),
+                      "The number of Input(X) and Output(Out) should be equal");
+    ctx->SetOutputsDim("Out", x_dims);
+    for (size_t i = 0; i < x_dims.size(); ++i) {
+      ctx->ShareLoD("X", /*->*/ "Out", i, i);
+    }
   }
 };
 
@@ -61,8 +71,8 @@ class RNNMemoryHelperOpInfoMaker : public framework::OpProtoAndCheckerMaker {
  public:
   RNNMemoryHelperOpInfoMaker(OpProto *proto, OpAttrChecker *op_checker)
       : OpProtoAndCheckerMaker(proto, op_checker) {
-    AddInput("X", "");
-    AddOutput("Out", "");
+    AddInput("X", "").AsDuplicable();
+    AddOutput("Out", "").AsDuplicable();
     AddAttr<int>("dtype",
                  "(int, default 5 (FP32)) "
                  "Output data type")
@@ -82,34 +92,46 @@ class RNNMemoryHelperGradOp : public framework::OperatorBase {
  private:
   void RunImpl(const framework::Scope &scope,
                const platform::Place &dev_place) const override {
-    auto out_grad_var_name = Input(framework::GradVarName("Out"));
-    auto *out_grad_var = scope.FindVar(out_grad_var_name);
-
-    auto in_grad_var_name = Output(framework::GradVarName("X"));
-    auto *in_grad_var = scope.FindVar(in_grad_var_name);
-    PADDLE_ENFORCE(in_grad_var != nullptr,
-                   "Cannot find in_grad_var in scope, name is %s",
-                   in_grad_var_name);
-
-    if (out_grad_var == nullptr) {
-      VLOG(5) << "Using fill constant 0 as starting gradient";
-      auto in_var_name = Input("X");
-      auto *in_var = scope.FindVar(in_var_name);
-      auto &in_var_tensor = in_var->Get<framework::LoDTensor>();
-
-      framework::AttributeMap attrs;
-      attrs["dtype"] = framework::ToDataType(in_var_tensor.type());
-      attrs["shape"] = framework::vectorize2int(in_var_tensor.dims());
-      attrs["value"] = 0.0f;
-
-      auto zero_op = framework::OpRegistry::CreateOp(
-          "fill_constant", {}, {{"Out", {in_grad_var_name}}}, attrs);
-      zero_op->Run(scope, dev_place);
-    } else {
-      auto &out_grad_tensor = out_grad_var->Get<framework::LoDTensor>();
-      auto *in_grad_tensor = in_grad_var->GetMutable<framework::LoDTensor>();
-      in_grad_tensor->ShareDataWith(out_grad_tensor);
-      in_grad_tensor->set_lod(out_grad_tensor.lod());
+    auto &out_grad_var_names = Inputs(framework::GradVarName("Out"));
+    auto &in_var_names = Inputs("X");
+    auto &in_grad_var_names = Outputs(framework::GradVarName("X"));
+    PADDLE_ENFORCE_EQ(in_var_names.size(), in_grad_var_names.size(),
+                      "The number of Input(X) and Output(X@GRAD) should be "
+                      "equal");
+    PADDLE_ENFORCE_EQ(in_var_names.size(), out_grad_var_names.size(),
+                      "The number of Input(X) and Input(Out@GRAD) should be "
+                      "equal");
+
+    for (size_t i = 0; i < in_var_names.size(); ++i) {
+      auto &in_grad_var_name = in_grad_var_names[i];
+      if (in_grad_var_name == framework::kEmptyVarName) {
+        continue;
+      }
+      auto *in_grad_var = scope.FindVar(in_grad_var_name);
+      PADDLE_ENFORCE(in_grad_var != nullptr,
+                     "Cannot find in_grad_var in scope, name is %s",
+                     in_grad_var_name);
+
+      auto *out_grad_var = scope.FindVar(out_grad_var_names[i]);
+      if (out_grad_var == nullptr) {
+        VLOG(5) << "Using fill constant 0 as starting gradient";
+        auto *in_var = scope.FindVar(in_var_names[i]);
+        auto &in_var_tensor = in_var->Get<framework::LoDTensor>();
+
+        framework::AttributeMap attrs;
+        attrs["dtype"] = framework::ToDataType(in_var_tensor.type());
+        attrs["shape"] = framework::vectorize2int(in_var_tensor.dims());
+        attrs["value"] = 0.0f;
+
+        auto zero_op = framework::OpRegistry::CreateOp(
+            "fill_constant", {}, {{"Out", {in_grad_var_name}}}, attrs);
+        zero_op->Run(scope, dev_place);
+      } else {
+        auto &out_grad_tensor = out_grad_var->Get<framework::LoDTensor>();
+        auto *in_grad_tensor = in_grad_var->GetMutable<framework::LoDTensor>();
+        in_grad_tensor->ShareDataWith(out_grad_tensor);
+        in_grad_tensor->set_lod(out_grad_tensor.lod());
+      }
     }
   }
 };
@@ -119,10 +141,10 @@ class RNNMemoryHelperGradOpInfoMaker
  public:
   RNNMemoryHelperGradOpInfoMaker(OpProto *proto, OpAttrChecker *op_checker)
       : OpProtoAndCheckerMaker(proto, op_checker) {
-    AddInput(framework::GradVarName("Out"), "");
-    AddInput("X", "");
-    AddInput("Out", "");
-    AddOutput(framework::GradVarName("X"), "");
+    AddInput(framework::GradVarName("Out"), "").AsDuplicable();
+    AddInput("X", "").AsDuplicable();
+    AddInput("Out", "").AsDuplicable();
+    AddOutput(framework::GradVarName("X"), "").AsDuplicable();
     AddAttr<int>("dtype",
                  "(int, default 5 (FP32)) "
                  "Output data type")
@@ -135,10 +157,16 @@ class RNNMemoryHelperGradOpShapeInference : public framework::InferShapeBase {
  public:
   void operator()(framework::InferShapeContext *ctx) const override {
     auto x_grad_name = framework::GradVarName("X");
-    PADDLE_ENFORCE(ctx->HasOutput(x_grad_name), "");
-    PADDLE_ENFORCE(ctx->HasInput("X"), "");
-    ctx->SetOutputDim(x_grad_name, ctx->GetInputDim("X"));
-    ctx->ShareLoD("X", /*->*/ x_grad_name);
+    PADDLE_ENFORCE(ctx->HasInputs("X"), "");
+    // The gradients of the memories in no_grad_set are kEmptyVarName.
+    auto &x_grad_var_names = ctx->Outputs(x_grad_name);
+    PADDLE_ENFORCE(!x_grad_var_names.empty(), "");
+    ctx->SetOutputsDim(x_grad_name, ctx->GetInputsDim("X"));
+    for (size_t i = 0; i < x_grad_var_names.size(); ++i) {
+      if (x_grad_var_names[i] != framework::kEmptyVarName) {
+        ctx->ShareLoD("X", /*->*/ x_grad_name, i, i);
+      }
+    }
   }
 };
 
@@ -148,7 +176,7 @@ class RNNMemoryHelperGradOpShapeInference : public framework::InferShapeBase {
 REGISTER_OPERATOR(rnn_memory_helper, paddle::operators::RNNMemoryHelperOp,
                   paddle::operators::RNNMemoryHelperOpInfoMaker,
                   paddle::operators::RNNMemoryHelperOpShapeInference,
-                  paddle::framework::DefaultGradOpDescMaker<true>);
+                  paddle::framework::DefaultGradOpDescMaker<false>);
 REGISTER_OPERATOR(rnn_memory_helper_grad,
                   paddle::operators::RNNMemoryHelperGradOp,
                   paddle::operators::RNNMemoryHelperGradOpInfoMaker,
@@ -199,6 +199,7 @@ void BindBlockDesc(pybind11::module *m) {
            pybind11::return_value_policy::reference)
       .def("op_size", &pd::BlockDesc::OpSize)
       .def("op", &pd::BlockDesc::Op, pybind11::return_value_policy::reference)
+      .def("collect_free_vars", &pd::BlockDesc::CollectFreeVarNames)
       .def("serialize_to_string", SerializeMessage<pd::BlockDesc>);
 }
 
@@ -246,6 +246,9 @@ def _callback_lookup_(op):
                 for o_param in current_op_desc.output_names():
                     for o_argu in current_op_desc.output(o_param):
                         if o_argu in self.param_grad_names:
+                            # parallel_do_grad only copies the gradients of
+                            # the first place back, so reducing onto root 0
+                            # is enough and cheaper than an all-reduce.
                             allreduce_out_name = o_argu + "__nccl_all_reduce__"
                             op_desc = _create_op_desc_(
                                 "ncclReduce",
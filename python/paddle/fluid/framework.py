@@ -57,6 +57,23 @@ def convert_np_dtype_to_dtype_(np_dtype):
     Returns(core.VarDesc.VarType): the data type in Paddle
 
     """
+    try:
+        return _np_dtype_cache_[np_dtype]
+    except (KeyError, TypeError):  # not seen yet, or not hashable
+        pass
+    dtype = _convert_np_dtype_(np_dtype)
+    try:
+        _np_dtype_cache_[np_dtype] = dtype
+    except TypeError:
+        pass
+    return dtype
+
+
+# memo of convert_np_dtype_to_dtype_, keyed by the dtype as given
+_np_dtype_cache_ = dict()
+
+
+def _convert_np_dtype_(np_dtype):
     dtype = np.dtype(np_dtype)
     if dtype == np.float32:
         return core.VarDesc.VarType.FP32
@@ -722,6 +739,20 @@ class Block(object):
             raise ValueError("var %s not in this block" % name)
         return v
 
+    def vars_by_names(self, names):
+        """
+        Get several variables of this block at once.
+        Args:
+            names(list): The names of the variables.
+
+        Returns(list): The variables, in the same order as names.
+
+        """
+        try:
+            return [self.vars[name] for name in names]
+        except KeyError as e:
+            raise ValueError("var %s not in this block" % e.args[0])
+
     def var_recursive(self, name):
         frontier = list()
         visited = set()
@@ -750,6 +781,47 @@ class Block(object):
 
         raise ValueError("Var {0} is not found recursively".format(name))
 
+    def vars_recursive(self, names):
+        """
+        Find several variables with one traversal of the blocks. The lookup
+        order is the same as var_recursive.
+        Args:
+            names(list): The names of the variables.
+
+        Returns(list): The variables, in the same order as names.
+
+        """
+        found = dict()
+        pending = set(names)
+        frontier = collections.deque([self])
+        visited = set()
+
+        prog = self.program
+
+        while len(frontier) != 0 and len(pending) != 0:  # BFS
+            cur = frontier.popleft()
+
+            if id(cur) in visited:
+                continue
+
+            hits = pending.intersection(cur.vars)
+            for name in hits:
+                found[name] = cur.vars[name]
+            pending.difference_update(hits)
+
+            if cur.parent_idx != -1:
+                frontier.append(prog.block(cur.parent_idx))
+
+            if cur.forward_block_idx != -1:
+                frontier.append(prog.block(cur.forward_block_idx))
+
+            visited.add(id(cur))
+
+        if len(pending) != 0:
+            raise ValueError("Var {0} is not found recursively".format(
+                pending.pop()))
+        return [found[name] for name in names]
+
     def all_parameters(self):
         return list(self.iter_parameters())
 
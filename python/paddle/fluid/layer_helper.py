@@ -428,3 +428,38 @@ class LayerHelper(object):
         if not isinstance(param, cls):
             raise TypeError("The input {0} parameter of method {1} must be {2}",
                             param_name, self.layer_type, cls.__name__)
+
+
+def _simple_append_op(type,
+                      inputs,
+                      outputs,
+                      attrs=None,
+                      out_dtype=None,
+                      stop_gradient=False,
+                      block=None):
+    """
+    Append an operator to `block`, by default the current block of the
+    default main program, without constructing a LayerHelper. It is meant for
+    the small layers which only wrap a single operator and are called many
+    times while building a program.
+
+    Every output mapped to None is replaced by a new temporary variable of
+    `out_dtype` and `stop_gradient`, named the same way as
+    LayerHelper.create_tmp_variable.
+
+    Returns(dict): The outputs of the appended operator.
+    """
+    if block is None:
+        block = default_main_program().current_block()
+    layer_name = None
+    for out_name, out_var in outputs.items():
+        if out_var is None:
+            if layer_name is None:
+                layer_name = unique_name.generate(type)
+            outputs[out_name] = block.create_var(
+                name=unique_name.generate(".".join([layer_name, 'tmp'])),
+                dtype=out_dtype,
+                persistable=False,
+                stop_gradient=stop_gradient)
+    block.append_op(type=type, inputs=inputs, outputs=outputs, attrs=attrs)
+    return outputs
@@ -11,15 +11,16 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import collections
 import contextlib
 
 from layer_function_generator import autodoc
-from tensor import assign, fill_constant
+from tensor import fill_constant
 from .. import core
-from ..framework import Program, Variable, Operator
-from ..layer_helper import LayerHelper, unique_name
+from ..framework import Program, Variable, Operator, default_main_program
+from ..layer_helper import LayerHelper, unique_name, _simple_append_op
 from ..initializer import force_init_on_cpu
-from ops import logical_and, logical_not, logical_or
+from ops import logical_and, logical_not, logical_or, logical_xor
 
 __all__ = [
     'split_lod_tensor',
@@ -51,6 +52,10 @@ __all__ = [
     'Print',
 ]
 
+_STEP_SCOPES = core.VarDesc.VarType.STEP_SCOPES
+_LOD_RANK_TABLE = core.VarDesc.VarType.LOD_RANK_TABLE
+_LOD_TENSOR_ARRAY = core.VarDesc.VarType.LOD_TENSOR_ARRAY
+
 
 def split_lod_tensor(input, mask, level=0):
     """
@@ -83,19 +88,17 @@ def split_lod_tensor(input, mask, level=0):
           out_true, out_false = layers.split_lod_tensor(
                 input=x, mask=y, level=level)
     """
-    helper = LayerHelper('split_lod_tensor', **locals())
-    out_true = helper.create_tmp_variable(dtype=input.dtype)
-    out_false = helper.create_tmp_variable(dtype=input.dtype)
-    helper.append_op(
+    outputs = _simple_append_op(
         type='split_lod_tensor',
         inputs={
             'X': input,
             'Mask': mask,
         },
-        outputs={'OutTrue': out_true,
-                 'OutFalse': out_false},
-        attrs={'level': level})
-    return out_true, out_false
+        outputs={'OutTrue': None,
+                 'OutFalse': None},
+        attrs={'level': level},
+        out_dtype=input.dtype)
+    return outputs['OutTrue'], outputs['OutFalse']
 
 
 def merge_lod_tensor(in_true, in_false, x, mask, level=0):
@@ -133,17 +136,16 @@ def merge_lod_tensor(in_true, in_false, x, mask, level=0):
           out = layers.merge_lod_tensor(
                 in_true=out_true, in_false=out_false, mask=y, x=x, level=level)
     """
-    helper = LayerHelper('merge_lod_tensor', **locals())
-    out = helper.create_tmp_variable(dtype=in_true.dtype)
-    helper.append_op(
+    outputs = _simple_append_op(
         type='merge_lod_tensor',
         inputs={'X': x,
                 'Mask': mask,
                 'InTrue': in_true,
                 'InFalse': in_false},
-        outputs={'Out': out},
-        attrs={'level': level})
-    return out
+        outputs={'Out': None},
+        attrs={'level': level},
+        out_dtype=in_true.dtype)
+    return outputs['Out']
 
 
 def Print(input,
@@ -188,9 +190,9 @@ def Print(input,
         Print(value, summarize=10,
               message="The content of some_layer: ")
     '''
-    helper = LayerHelper('print', **locals())
-    out = helper.create_tmp_variable(dtype=helper.input_dtype())
-    helper.append_op(
+    if not isinstance(input, Variable):
+        raise TypeError("The input of Print should be a Variable")
+    outputs = _simple_append_op(
         type='print',
         inputs={'In': input},
         attrs={
@@ -203,8 +205,9 @@ def Print(input,
             'print_tensor_lod': print_tensor_lod,
             'print_phase': print_phase.upper()
         },
-        outputs={'Out': out})
-    return out
+        outputs={'Out': None},
+        out_dtype=input.dtype)
+    return outputs['Out']
 
 
 class BlockGuard(object):
@@ -225,9 +228,7 @@ class BlockGuard(object):
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.main_program.rollback()
-        if exc_type is not None:
-            return False  # re-raise exception
-        return True
+        return exc_type is None  # re-raise exception if any
 
 
 class ParallelDo(object):
@@ -235,6 +236,14 @@ class ParallelDo(object):
     ParallelDo class.
 
     ParallelDo class is used to create a ParallelDo.
+
+    Args:
+        places(Variable): the places to run the sub block on, as returned by
+            get_places.
+        use_nccl(bool): if True, the parameter gradients are summed with NCCL
+            reduce ops onto the first place during backward, instead of being
+            accumulated by parallel_do_grad. Only CUDA places are supported.
+        name(str|None): a name prefix for the layer.
     """
 
     def __init__(self, places, use_nccl=False, name=None):
@@ -244,26 +253,32 @@ class ParallelDo(object):
         self.outputs = []
         self.status = StaticRNN.BEFORE_RNN_BLOCK
         self.use_nccl = use_nccl
+        self._parent_block_cache = None
+        self._result = None  # what __call__ returns, bound by complete_op
 
     def do(self):
         return BlockGuardWithCompletion(self)
 
     def parent_block(self):
-        prog = self.helper.main_program
-        parent_idx = prog.current_block().parent_idx
-        assert parent_idx >= 0
-        parent_block = prog.block(parent_idx)
-        return parent_block
+        if self._parent_block_cache is None:
+            prog = self.helper.main_program
+            parent_idx = prog.current_block().parent_idx
+            assert parent_idx >= 0
+            self._parent_block_cache = prog.block(parent_idx)
+        return self._parent_block_cache
 
     def __call__(self, *args, **kwargs):
         if self.status != StaticRNN.AFTER_RNN_BLOCK:
             raise ValueError("RNN output can only be retrieved after rnn block")
-        if len(self.outputs) == 0:
+        if self._result is None:
             raise ValueError("RNN has no output")
-        elif len(self.outputs) == 1:
-            return self.outputs[0]
-        else:
-            return self.outputs
+        return self._result
+
+    def _bind_result(self):
+        if len(self.outputs) == 1:
+            self._result = self.outputs[0]
+        elif len(self.outputs) > 1:
+            self._result = self.outputs
 
     def read_input(self, var):
         self.inputs.append(var)
@@ -277,22 +292,8 @@ class ParallelDo(object):
         current_block = main_program.current_block()
         parent_block = self.parent_block()
 
-        local_inputs = set()
-        params = list()
-        for var in self.inputs:
-            local_inputs.add(var.name)
-
-        for op in current_block.ops:
-            for iname in op.input_names:
-                for in_var_name in op.input(iname):
-                    if in_var_name not in local_inputs:
-                        params.append(in_var_name)
-
-            for oname in op.output_names:
-                for out_var_name in op.output(oname):
-                    local_inputs.add(out_var_name)
-
-        params = list(set(params))
+        params = current_block.desc.collect_free_vars(
+            [var.name for var in self.inputs], True)
 
         return [parent_block.var(name) for name in params]
 
@@ -301,8 +302,7 @@ class ParallelDo(object):
         current_block = main_program.current_block()
         parent_block = self.parent_block()
 
-        step_scope = parent_block.create_var(
-            type=core.VarDesc.VarType.STEP_SCOPES)
+        step_scope = parent_block.create_var(type=_STEP_SCOPES)
 
         self.outputs = [
             parent_block.create_var(
@@ -314,20 +314,20 @@ class ParallelDo(object):
                 stop_gradient=o.stop_gradient) for o in self.outputs
         ]
 
-        inputs = [parent_block.var(i.name) for i in self.inputs]
-        outputs = [parent_block.var(o.name) for o in self.outputs]
-
+        # the inputs are read from the parent block, so their names are
+        # passed straight through instead of being looked up again
         parent_block.append_op(
             type='parallel_do',
             inputs={
-                'inputs': inputs,
+                'inputs': [i.name for i in self.inputs],
                 'parameters': self.get_parameters(),
                 'places': self.places
             },
-            outputs={'outputs': outputs,
+            outputs={'outputs': self.outputs,
                      'parallel_scopes': [step_scope]},
             attrs={'sub_block': current_block,
                    'use_nccl': self.use_nccl})
+        self._bind_result()
 
 
 class BlockGuardWithCompletion(BlockGuard):
@@ -357,6 +357,32 @@ class BlockGuardWithCompletion(BlockGuard):
                                                               exc_tb)
 
 
+def _append_rnn_memory_helper_ops(block, xs, outs):
+    """
+    Link each xs[i] to outs[i] with rnn_memory_helper ops, as few as possible.
+
+    A variable may appear only once in the X of one op: backward renames
+    repeated gradient outputs per op, not per slot, so the gradients of a
+    repeated X could not be summed. The k-th repeat of a variable therefore
+    goes to the k-th op.
+    """
+    groups = []
+    repeats = collections.defaultdict(int)
+    for x, out in zip(xs, outs):
+        k = repeats[x.name]
+        repeats[x.name] += 1
+        if k == len(groups):
+            groups.append(([], []))
+        groups[k][0].append(x)
+        groups[k][1].append(out)
+
+    for x_group, out_group in groups:
+        block.append_op(
+            type='rnn_memory_helper',
+            inputs={'X': x_group},
+            outputs={'Out': out_group})
+
+
 class StaticRNNMemoryLink(object):
     """
     StaticRNNMemoryLink class.
@@ -392,12 +418,24 @@ class StaticRNN(object):
 
     def __init__(self, name=None):
         self.helper = LayerHelper("static_rnn", name=name)
-        self.memories = {}  # memory map, from pre_mem.name --> MemoryLink
+        # memories are kept as parallel lists of the boot, previous-step and
+        # current-step variables, indexed through pre_mem.name
+        self._mem_init = []
+        self._mem_pre = []
+        self._mem_cur = []
+        self._mem_index = {}
         self.inputs = []  # input variable list in current block
         self.outputs = []  # output variable list in parent block
         self.status = StaticRNN.BEFORE_RNN_BLOCK  # status flag.
         # sequence length, since it is a static RNN, sequence length are fixed.
         self.seq_len = None
+        self._parent_block_cache = None
+        self._result = None  # what __call__ returns, bound by complete_op
+        # the i-th memory and its boot memory are named <prefix>_i
+        self._mem_prefix = unique_name.generate("@".join(
+            [self.helper.name, "mem"]))
+        self._boot_prefix = unique_name.generate("@".join(
+            [self.helper.name, "memory_boot"]))
 
     def step(self):
         return BlockGuardWithCompletion(self)
@@ -428,10 +466,8 @@ class StaticRNN(object):
                 raise ValueError(
                     "if init is None, memory at least need shape and batch_ref")
             parent_block = self.parent_block()
-            var_name = unique_name.generate("@".join(
-                [self.helper.name, "memory_boot"]))
             boot_var = parent_block.create_var(
-                name=var_name,
+                name="_".join([self._boot_prefix, str(len(self._mem_pre))]),
                 shape=shape,
                 dtype=batch_ref.dtype,
                 persistable=False)
@@ -451,11 +487,13 @@ class StaticRNN(object):
             return self.memory(init=boot_var)
         else:
             pre_mem = self.helper.create_variable(
-                name=unique_name.generate("@".join([self.helper.name, "mem"])),
+                name="_".join([self._mem_prefix, str(len(self._mem_pre))]),
                 dtype=init.dtype,
                 shape=init.shape)
-            self.memories[pre_mem.name] = StaticRNNMemoryLink(
-                init=init, pre_mem=pre_mem)
+            self._mem_index[pre_mem.name] = len(self._mem_pre)
+            self._mem_init.append(init)
+            self._mem_pre.append(pre_mem)
+            self._mem_cur.append(None)
             return pre_mem
 
     def step_input(self, x):
@@ -473,101 +511,88 @@ class StaticRNN(object):
         return ipt
 
     def step_output(self, o):
-        self._assert_in_rnn_block_('step_output')
-        if not isinstance(o, Variable):
-            raise TypeError("step output takes a Variable")
-
-        tmp_o = self.helper.create_tmp_variable(dtype=o.dtype)
-        self.helper.append_op(
-            type='rnn_memory_helper',
-            inputs={'X': [o]},
-            outputs={'Out': tmp_o},
-            attrs={'dtype': o.dtype})
+        self._step_outputs_([o])
 
-        out_var = self.parent_block().create_var(
-            name=tmp_o.name,
-            shape=[self.seq_len] + list(tmp_o.shape),
-            dtype=tmp_o.dtype)
+    def output(self, *outputs):
+        self._step_outputs_(outputs)
 
-        self.outputs.append(out_var)
+    def _step_outputs_(self, outputs):
+        self._assert_in_rnn_block_('step_output')
+        for o in outputs:
+            if not isinstance(o, Variable):
+                raise TypeError("step output takes a Variable")
+        if len(outputs) == 0:
+            return
+
+        # link all the outputs of a step with as few ops as possible
+        tmp_outs = [
+            self.helper.create_tmp_variable(dtype=o.dtype) for o in outputs
+        ]
+        _append_rnn_memory_helper_ops(self.helper.main_program.current_block(),
+                                      outputs, tmp_outs)
 
-    def output(self, *outputs):
-        for each in outputs:
-            self.step_output(each)
+        parent_block = self.parent_block()
+        for tmp_o in tmp_outs:
+            out_var = parent_block.create_var(
+                name=tmp_o.name,
+                shape=[self.seq_len] + list(tmp_o.shape),
+                dtype=tmp_o.dtype)
+            self.outputs.append(out_var)
 
     def update_memory(self, mem, var):
         if not isinstance(mem, Variable) or not isinstance(var, Variable):
             raise TypeError("update memory should take variables")
-        self.memories[mem.name].mem = var
+        self._mem_cur[self._mem_index[mem.name]] = var
 
     def parent_block(self):
-        prog = self.helper.main_program
-        parent_idx = prog.current_block().parent_idx
-        assert parent_idx >= 0
-        parent_block = prog.block(parent_idx)
-        return parent_block
+        if self._parent_block_cache is None:
+            prog = self.helper.main_program
+            parent_idx = prog.current_block().parent_idx
+            assert parent_idx >= 0
+            self._parent_block_cache = prog.block(parent_idx)
+        return self._parent_block_cache
 
     def __call__(self, *args, **kwargs):
         if self.status != StaticRNN.AFTER_RNN_BLOCK:
             raise ValueError("RNN output can only be retrieved after rnn block")
-        if len(self.outputs) == 0:
+        if self._result is None:
             raise ValueError("RNN has no output")
-        elif len(self.outputs) == 1:
-            return self.outputs[0]
-        else:
-            return self.outputs
+        return self._result
+
+    def _bind_result(self):
+        if len(self.outputs) == 1:
+            self._result = self.outputs[0]
+        elif len(self.outputs) > 1:
+            self._result = self.outputs
 
     def complete_op(self):
         main_program = self.helper.main_program
         rnn_block = main_program.current_block()
         parent_block = self.parent_block()
 
-        local_inputs = set()
-
-        for op in rnn_block.ops:
-            assert isinstance(op, Operator)
-            for oname in op.output_names:
-                for out_var_name in op.output(oname):
-                    local_inputs.add(out_var_name)
-
-        for var in self.inputs:
-            local_inputs.add(var.name)
-        for m in self.memories:
-            local_inputs.add(m)
-
-        params = list()
-        for op in rnn_block.ops:
-            assert isinstance(op, Operator)
-            for iname in op.input_names:
-                for in_var_name in op.input(iname):
-                    if in_var_name not in local_inputs:
-                        params.append(in_var_name)
+        # every output of the step block is local, no matter which op reads it
+        params = rnn_block.desc.collect_free_vars(
+            [var.name for var in self.inputs + self._mem_pre], False)
 
         parameters = [parent_block.var(name) for name in params]
 
-        step_scope = parent_block.create_var(
-            type=core.VarDesc.VarType.STEP_SCOPES)
+        step_scope = parent_block.create_var(type=_STEP_SCOPES)
 
-        inlinks = [parent_block.var(i.name) for i in self.inputs]
+        # step inputs share their name with the parent block variable
+        inlinks = [i.name for i in self.inputs]
         outlinks = self.outputs
 
-        boot_memories = []
-        pre_memories = []
-        memories = []
-        for _, mem in self.memories.iteritems():
-            boot_memories.append(mem.init)
-            pre_memories.append(mem.pre_mem.name)
-            mem_var = rnn_block.var(mem.mem.name)
-            assert isinstance(mem_var, Variable)
-            new_mem = self.helper.create_tmp_variable(dtype=mem_var.dtype)
-
-            rnn_block.append_op(
-                type='rnn_memory_helper',
-                inputs={'X': [mem_var]},
-                outputs={'Out': [new_mem]},
-                attrs={'dtype': mem_var.dtype})
+        boot_memories = self._mem_init
+        pre_memories = [pre_mem.name for pre_mem in self._mem_pre]
+        mem_vars = [rnn_block.var(mem.name) for mem in self._mem_cur]
+        new_mems = [
+            self.helper.create_tmp_variable(dtype=mem_var.dtype)
+            for mem_var in mem_vars
+        ]
 
-            memories.append(new_mem.name)
+        # link all the memories of a step with as few ops as possible
+        _append_rnn_memory_helper_ops(rnn_block, mem_vars, new_mems)
+        memories = [new_mem.name for new_mem in new_mems]
 
         parent_block.append_op(
             type='recurrent',
@@ -583,6 +608,7 @@ class StaticRNN(object):
                 'states': memories,
                 'sub_block': rnn_block
             })
+        self._bind_result()
 
 
 class WhileGuard(BlockGuard):
@@ -617,7 +643,7 @@ class While(object):
         assert isinstance(cond, Variable)
         if cond.dtype != core.VarDesc.VarType.BOOL:
             raise TypeError("condition should be a bool variable")
-        if reduce(lambda a, b: a * b, cond.shape, 1) != 1:
+        if any(d != 1 for d in cond.shape):
             raise TypeError("condition should be a bool scalar")
         self.cond_var = cond
 
@@ -630,31 +656,29 @@ class While(object):
         parent_block = main_program.block(main_program.current_block()
                                           .parent_idx)
 
-        inner_outputs = {self.cond_var.name}
-        x_name_list = set()
+        # ordered, so that the inputs and outputs of the while op follow the
+        # order in which the ops of the block use them
+        inner_outputs = collections.OrderedDict.fromkeys([self.cond_var.name])
+        x_name_list = collections.OrderedDict()
         for op in while_block.ops:
-            for iname in op.input_names:
-                for in_var_name in op.input(iname):
-                    if in_var_name not in inner_outputs:
-                        x_name_list.add(in_var_name)
+            for in_var_name in op.input_arg_names:
+                if in_var_name not in inner_outputs:
+                    x_name_list[in_var_name] = None
 
-            for oname in op.output_names:
-                for out_var_name in op.output(oname):
-                    inner_outputs.add(out_var_name)
+            for out_var_name in op.output_arg_names:
+                inner_outputs[out_var_name] = None
 
-        out_vars = []
-        for inner_out_name in inner_outputs:
-            if inner_out_name in parent_block.vars:
-                out_vars.append(parent_block.var(inner_out_name))
+        parent_vars = parent_block.vars
+        out_vars = [
+            parent_vars[name] for name in inner_outputs if name in parent_vars
+        ]
 
-        step_scope = parent_block.create_var(
-            type=core.VarDesc.VarType.STEP_SCOPES)
+        step_scope = parent_block.create_var(type=_STEP_SCOPES)
 
         parent_block.append_op(
             type='while',
             inputs={
-                'X':
-                [parent_block.var_recursive(x_name) for x_name in x_name_list],
+                'X': parent_block.vars_recursive(list(x_name_list)),
                 'Condition': [self.cond_var]
             },
             outputs={'Out': out_vars,
@@ -708,15 +732,15 @@ def lod_rank_table(x, level=0):
                             dtype='float32', lod_level=1)
             out = layers.lod_rank_table(x=x, level=0)
     """
-    helper = LayerHelper("lod_rank_table", **locals())
-    table = helper.create_variable(
-        type=core.VarDesc.VarType.LOD_RANK_TABLE,
-        name=unique_name.generate("lod_rank_table"))
-    helper.append_op(
+    block = default_main_program().current_block()
+    table = block.create_var(
+        type=_LOD_RANK_TABLE, name=unique_name.generate("lod_rank_table"))
+    _simple_append_op(
         type='lod_rank_table',
         inputs={'X': x},
         outputs={'Out': table},
-        attrs={'level': level})
+        attrs={'level': level},
+        block=block)
     return table
 
 
@@ -741,13 +765,12 @@ def max_sequence_len(rank_table):
             rank_table = layers.lod_rank_table(x=x, level=0)
             max_seq_len = layers.max_sequence_len(rank_table)
     """
-    helper = LayerHelper("max_seqence_len", **locals())
-    res = helper.create_tmp_variable(dtype="int64")
-    helper.append_op(
+    outputs = _simple_append_op(
         type="max_sequence_len",
         inputs={"RankTable": rank_table},
-        outputs={"Out": res})
-    return res
+        outputs={"Out": None},
+        out_dtype="int64")
+    return outputs["Out"]
 
 
 def lod_tensor_to_array(x, table):
@@ -770,16 +793,17 @@ def lod_tensor_to_array(x, table):
           table = fluid.layers.lod_rank_table(x, level=0)
           array = fluid.layers.lod_tensor_to_array(x, table)
     """
-    helper = LayerHelper("lod_tensor_to_array", **locals())
-    array = helper.create_variable(
+    block = default_main_program().current_block()
+    array = block.create_var(
         name=unique_name.generate("lod_tensor_to_array"),
-        type=core.VarDesc.VarType.LOD_TENSOR_ARRAY,
+        type=_LOD_TENSOR_ARRAY,
         dtype=x.dtype)
-    helper.append_op(
+    _simple_append_op(
         type='lod_tensor_to_array',
         inputs={'X': x,
                 'RankTable': table},
-        outputs={'Out': array})
+        outputs={'Out': array},
+        block=block)
     return array
 
 
@@ -804,14 +828,13 @@ def array_to_lod_tensor(x, table):
           array = fluid.layers.lod_tensor_to_array(x, table)
           lod_tensor = fluid.layers.array_to_lod_tensor(array, table)
     """
-    helper = LayerHelper("array_to_lod_tensor", **locals())
-    tmp = helper.create_tmp_variable(dtype=x.dtype)
-    helper.append_op(
+    outputs = _simple_append_op(
         type="array_to_lod_tensor",
         inputs={'X': x,
                 'RankTable': table},
-        outputs={'Out': tmp})
-    return tmp
+        outputs={'Out': None},
+        out_dtype=x.dtype)
+    return outputs['Out']
 
 
 def increment(x, value=1.0, in_place=True):
@@ -835,17 +858,13 @@ def increment(x, value=1.0, in_place=True):
           data = fluid.layers.data(name='data', shape=[32, 32], dtype='float32')
           data = fluid.layers.increment(x=data, value=3.0, in_place=True)
     """
-    helper = LayerHelper("increment", **locals())
-    if not in_place:
-        out = helper.create_tmp_variable(dtype=x.dtype)
-    else:
-        out = x
-    helper.append_op(
+    outputs = _simple_append_op(
         type='increment',
         inputs={'X': [x]},
-        outputs={'Out': [out]},
-        attrs={'step': float(value)})
-    return out
+        outputs={'Out': x if in_place else None},
+        attrs={'step': float(value)},
+        out_dtype=x.dtype)
+    return outputs['Out']
 
 
 def array_write(x, i, array=None):
@@ -875,23 +894,24 @@ def array_write(x, i, array=None):
           i = fluid.layers.fill_constant(shape=[1], dtype='int64', value=10)
           arr = layers.array_write(tmp, i=i)
     """
-    helper = LayerHelper('array_write', **locals())
+    block = default_main_program().current_block()
     if array is None:
-        array = helper.create_variable(
-            name="{0}.out".format(helper.name),
-            type=core.VarDesc.VarType.LOD_TENSOR_ARRAY,
+        array = block.create_var(
+            name="{0}.out".format(unique_name.generate('array_write')),
+            type=_LOD_TENSOR_ARRAY,
             dtype=x.dtype)
-    helper.append_op(
+    _simple_append_op(
         type='write_to_array',
         inputs={'X': [x],
                 'I': [i]},
-        outputs={'Out': [array]})
+        outputs={'Out': [array]},
+        block=block)
     return array
 
 
 def create_array(dtype):
-    """This function creates an array of type :math:`LOD_TENSOR_ARRAY` using the
-    LayerHelper.
+    """This function creates an array of type :math:`LOD_TENSOR_ARRAY` in the
+    current block of the default main program.
 
     Args:
         dtype (int|float): The data type of the elements in the array.
@@ -905,14 +925,13 @@ def create_array(dtype):
           data = fluid.layers.create_array(dtype='float32')
 
     """
-    helper = LayerHelper("array", **locals())
-    return helper.create_variable(
-        name="{0}.out".format(helper.name),
-        type=core.VarDesc.VarType.LOD_TENSOR_ARRAY,
+    return default_main_program().current_block().create_var(
+        name="{0}.out".format(unique_name.generate("array")),
+        type=_LOD_TENSOR_ARRAY,
         dtype=dtype)
 
 
-def less_than(x, y, force_cpu=True, cond=None, **ignored):
+def less_than(x, y, force_cpu=True, cond=None):
     """
     **Less than**
 
@@ -932,21 +951,18 @@ def less_than(x, y, force_cpu=True, cond=None, **ignored):
 
           less = fluid.layers.less_than(x=label, y=limit)
     """
-    helper = LayerHelper("less_than", **locals())
-    if cond is None:
-        cond = helper.create_tmp_variable(dtype='bool')
-        cond.stop_gradient = True
-
-    helper.append_op(
+    outputs = _simple_append_op(
         type='less_than',
         inputs={'X': [x],
                 'Y': [y]},
-        outputs={'Out': [cond]},
-        attrs={'force_cpu': force_cpu or force_init_on_cpu()})
-    return cond
+        outputs={'Out': cond},
+        attrs={'force_cpu': force_cpu or force_init_on_cpu()},
+        out_dtype='bool',
+        stop_gradient=True)
+    return outputs['Out']
 
 
-def equal(x, y, cond=None, **ignored):
+def equal(x, y, cond=None):
     """
     **equal**
 
@@ -965,15 +981,14 @@ def equal(x, y, cond=None, **ignored):
 
           less = fluid.layers.equal(x=label, y=limit)
     """
-    helper = LayerHelper("equal", **locals())
-    if cond is None:
-        cond = helper.create_tmp_variable(dtype='bool')
-        cond.stop_gradient = True
-
-    helper.append_op(
-        type='equal', inputs={'X': [x],
-                              'Y': [y]}, outputs={'Out': [cond]})
-    return cond
+    outputs = _simple_append_op(
+        type='equal',
+        inputs={'X': [x],
+                'Y': [y]},
+        outputs={'Out': cond},
+        out_dtype='bool',
+        stop_gradient=True)
+    return outputs['Out']
 
 
 def array_read(array, i):
@@ -991,18 +1006,15 @@ def array_read(array, i):
           i = fluid.layers.fill_constant(shape=[1], dtype='int64', value=10)
           arr = layers.array_read(tmp, i=i)
     """
-    helper = LayerHelper('array_read', **locals())
-    if not isinstance(
-            array,
-            Variable) or array.type != core.VarDesc.VarType.LOD_TENSOR_ARRAY:
+    if not isinstance(array, Variable) or array.type != _LOD_TENSOR_ARRAY:
         raise TypeError("array should be tensor array vairable")
-    out = helper.create_tmp_variable(dtype=array.dtype)
-    helper.append_op(
+    outputs = _simple_append_op(
         type='read_from_array',
         inputs={'X': [array],
                 'I': [i]},
-        outputs={'Out': [out]})
-    return out
+        outputs={'Out': None},
+        out_dtype=array.dtype)
+    return outputs['Out']
 
 
 def shrink_memory(x, i, table):
@@ -1010,16 +1022,15 @@ def shrink_memory(x, i, table):
     This function creates an operator to shrink_rnn_memory using the RankTable
     as mentioned in the input parameter.
     """
-    helper = LayerHelper('shrink_memory', **locals())
-    out = helper.create_tmp_variable(dtype=x.dtype)
-    helper.append_op(
+    outputs = _simple_append_op(
         type='shrink_rnn_memory',
         inputs={'X': [x],
                 'I': [i],
                 'RankTable': [table]},
-        outputs={'Out': [out]},
-        attrs={})
-    return out
+        outputs={'Out': None},
+        attrs={},
+        out_dtype=x.dtype)
+    return outputs['Out']
 
 
 def array_length(array):
@@ -1041,12 +1052,13 @@ def array_length(array):
           arr = fluid.layers.array_write(tmp, i=i)
           arr_len = fluid.layers.array_length(arr)
     """
-    helper = LayerHelper('array_length', **locals())
-    tmp = helper.create_tmp_variable(dtype='int64')
-    tmp.stop_gradient = True
-    helper.append_op(
-        type='lod_array_length', inputs={'X': [array]}, outputs={'Out': [tmp]})
-    return tmp
+    outputs = _simple_append_op(
+        type='lod_array_length',
+        inputs={'X': [array]},
+        outputs={'Out': None},
+        out_dtype='int64',
+        stop_gradient=True)
+    return outputs['Out']
 
 
 class ConditionalBlockGuard(BlockGuard):
@@ -1060,6 +1072,8 @@ class ConditionalBlockGuard(BlockGuard):
         return super(ConditionalBlockGuard, self).__enter__()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            return False
         self.block.complete()
         return super(ConditionalBlockGuard, self).__exit__(exc_type, exc_val,
                                                            exc_tb)
@@ -1071,6 +1085,7 @@ class ConditionalBlock(object):
             if not isinstance(each_input, Variable):
                 raise TypeError("Each input should be variable")
         self.inputs = inputs
+        self._input_name_set = frozenset(ipt.name for ipt in inputs)
         self.is_scalar_condition = is_scalar_condition
         self.helper = LayerHelper('conditional_block', name=name)
 
@@ -1081,33 +1096,32 @@ class ConditionalBlock(object):
         inside_block = self.helper.main_program.current_block()
         parent_block = self.helper.main_program.block(inside_block.parent_idx)
 
-        intermediate = set()
-        params = set()
+        # ordered sets of names, so the op is built deterministically
+        intermediate = collections.OrderedDict()
+        params = collections.OrderedDict()
 
         for each_op in inside_block.ops:
             assert isinstance(each_op, Operator)
-            for iname in each_op.input_names:
-                for in_var_name in each_op.input(iname):
-                    if in_var_name not in intermediate:
-                        params.add(in_var_name)
-
-            for oname in each_op.output_names:
-                for out_var_name in each_op.output(oname):
-                    intermediate.add(out_var_name)
-        input_set = set([ipt.name for ipt in self.inputs])
-
-        param_list = [
-            parent_block.var(each_name) for each_name in params
-            if each_name not in input_set
-        ]
+            for in_var_name in each_op.input_arg_names:
+                if in_var_name not in intermediate:
+                    params[in_var_name] = None
+
+            for out_var_name in each_op.output_arg_names:
+                intermediate[out_var_name] = None
 
+        input_set = self._input_name_set
+        param_list = parent_block.vars_by_names(
+            [each_name for each_name in params if each_name not in input_set])
+
+        # look the outputs up in the parent block rather than scanning
+        # every parent variable
+        parent_vars = parent_block.vars
         out_list = [
-            parent_block.var(var_name) for var_name in parent_block.vars
-            if var_name in intermediate
+            parent_vars[var_name] for var_name in intermediate
+            if var_name in parent_vars
         ]
 
-        step_scope = parent_block.create_var(
-            type=core.VarDesc.VarType.STEP_SCOPES)
+        step_scope = parent_block.create_var(type=_STEP_SCOPES)
         parent_block.append_op(
             type='conditional_block',
             inputs={
@@ -1126,7 +1140,8 @@ class Switch(object):
     def __init__(self, name=None):
         self.helper = LayerHelper('switch', name=name)
         self.inside_scope = False
-        self.pre_not_conditions = []
+        # true when none of the cases added so far matched
+        self.pre_not_condition = None
 
     def case(self, condition):
         """create a new block for this condition
@@ -1134,32 +1149,27 @@ class Switch(object):
         if not self.inside_scope:
             raise ValueError("case should be called inside with")
 
-        if len(self.pre_not_conditions) == 0:
+        if self.pre_not_condition is None:
             cond_block = ConditionalBlock([condition], is_scalar_condition=True)
-            not_cond = logical_not(x=condition)
-            self.pre_not_conditions.append(not_cond)
+            self.pre_not_condition = logical_not(x=condition)
         else:
-            pre_cond_num = len(self.pre_not_conditions)
-            pre_not_cond = self.pre_not_conditions[pre_cond_num - 1]
-            new_not_cond = logical_and(
-                x=pre_not_cond, y=logical_not(x=condition))
-            self.pre_not_conditions.append(new_not_cond)
+            pre_not_cond = self.pre_not_condition
+            entry_cond = logical_and(x=pre_not_cond, y=condition)
+            # entry_cond implies pre_not_cond, so xor leaves
+            # pre_not_cond and not condition
+            self.pre_not_condition = logical_xor(x=pre_not_cond, y=entry_cond)
             cond_block = ConditionalBlock(
-                [logical_and(
-                    x=pre_not_cond, y=condition)],
-                is_scalar_condition=True)
+                [entry_cond], is_scalar_condition=True)
 
         return ConditionalBlockGuard(cond_block)
 
     def default(self):
         """create a default case for this switch
         """
-        pre_cond_num = len(self.pre_not_conditions)
-        if pre_cond_num == 0:
+        if self.pre_not_condition is None:
             raise ValueError("there should be at least one condition")
         cond_block = ConditionalBlock(
-            [self.pre_not_conditions[pre_cond_num - 1]],
-            is_scalar_condition=True)
+            [self.pre_not_condition], is_scalar_condition=True)
         return ConditionalBlockGuard(cond_block)
 
     def __enter__(self):
@@ -1221,7 +1231,7 @@ class IfElse(object):
             raise TypeError("cond must be a Variable")
         self.helper = LayerHelper('ifelse', name=name)
         self.cond = cond
-        self.input_table = {}
+        self.input_table = {}  # x.name --> (out_true, out_false)
         self.status = IfElse.OUT_IF_ELSE_BLOCKS
         self.conditional_true_block = ConditionalBlock(inputs=[self.cond])
         self.conditional_false_block = ConditionalBlock(inputs=[self.cond])
@@ -1230,15 +1240,13 @@ class IfElse(object):
     def input(self, x):
         if self.status == IfElse.OUT_IF_ELSE_BLOCKS:
             raise ValueError("input must in true/false blocks")
-        if id(x) not in self.input_table:
+        if x.name not in self.input_table:
             parent_block = self.parent_block()
-            out_true = parent_block.create_var(
-                name=unique_name.generate('ifelse_input' + self.helper.name),
-                dtype=x.dtype)
+            true_name, false_name = unique_name.generate_batch(
+                'ifelse_input' + self.helper.name, 2)
+            out_true = parent_block.create_var(name=true_name, dtype=x.dtype)
 
-            out_false = parent_block.create_var(
-                name=unique_name.generate('ifelse_input' + self.helper.name),
-                dtype=x.dtype)
+            out_false = parent_block.create_var(name=false_name, dtype=x.dtype)
             parent_block.append_op(
                 type='split_lod_tensor',
                 inputs={
@@ -1248,9 +1256,9 @@ class IfElse(object):
                 outputs={'OutTrue': out_true,
                          'OutFalse': out_false},
                 attrs={'level': 0})
-            self.input_table[id(x)] = (out_true, out_false)
+            self.input_table[x.name] = (out_true, out_false)
         else:
-            out_true, out_false = self.input_table[id(x)]
+            out_true, out_false = self.input_table[x.name]
 
         if self.status == IfElse.IN_IF_ELSE_TRUE_BLOCKS:
             return out_true
@@ -1277,15 +1285,22 @@ class IfElse(object):
         for each_out in outs:
             if not isinstance(each_out, Variable):
                 raise TypeError("Each output should be a variable")
-            # create outside tensor
-            outside_out = parent_block.create_var(
-                name=unique_name.generate("_".join(
-                    [self.helper.name, 'output'])),
-                dtype=each_out.dtype)
-            out_table.append(outside_out)
+        out_names = unique_name.generate_batch(
+            "_".join([self.helper.name, 'output']), len(outs))
+        # create outside tensors
+        outside_outs = [
+            parent_block.create_var(name=out_name, dtype=each_out.dtype)
+            for each_out, out_name in zip(outs, out_names)
+        ]
+        out_table.extend(outside_outs)
 
-            # assign local var to outside
-            assign(input=each_out, output=outside_out)
+        # assign local vars to outside, all outs are known to be variables
+        current_block = self.helper.main_program.current_block()
+        for each_out, outside_out in zip(outs, outside_outs):
+            current_block.append_op(
+                type='assign',
+                inputs={'X': [each_out]},
+                outputs={'Out': [outside_out]})
 
     def __call__(self):
         if self.status != self.OUT_IF_ELSE_BLOCKS:
@@ -1326,7 +1341,6 @@ class DynamicRNN(object):
         self.step_idx = None
         self.zero_idx = fill_constant(
             shape=[1], value=0, dtype='int64', force_cpu=True)
-        self.mem_dict = dict()
         self.output_array = []
         self.outputs = []
         self.cond = self.helper.create_tmp_variable(dtype='bool')
@@ -1334,6 +1348,7 @@ class DynamicRNN(object):
         self.while_op = While(self.cond)
         self.input_array = []
         self.mem_link = []
+        self._parent_block_cache = None
 
     def step_input(self, x):
         self._assert_in_rnn_block_("step_input")
@@ -1344,7 +1359,7 @@ class DynamicRNN(object):
         if self.lod_rank_table is None:
             self.lod_rank_table = parent_block.create_var(
                 name=unique_name.generate('lod_rank_table'),
-                type=core.VarDesc.VarType.LOD_RANK_TABLE)
+                type=_LOD_RANK_TABLE)
             self.lod_rank_table.stop_gradient = True
             parent_block.append_op(
                 type='lod_rank_table',
@@ -1368,7 +1383,7 @@ class DynamicRNN(object):
 
         input_array = parent_block.create_var(
             name=unique_name.generate('dynamic_rnn_input_array'),
-            type=core.VarDesc.VarType.LOD_TENSOR_ARRAY,
+            type=_LOD_TENSOR_ARRAY,
             dtype=x.dtype)
         self.input_array.append((input_array, x.dtype))
         parent_block.append_op(
@@ -1407,17 +1422,22 @@ class DynamicRNN(object):
         self.step_idx.stop_gradient = False
         self.status = DynamicRNN.IN_RNN
         with self.while_op.block():
-            yield
-            increment(x=self.step_idx, value=1.0, in_place=True)
-
-            for new_mem, mem_array in self.mem_link:
-                array_write(x=new_mem, i=self.step_idx, array=mem_array)
-
-            less_than(
-                x=self.step_idx,
-                y=self.max_seq_len,
-                force_cpu=True,
-                cond=self.cond)
+            prog = self.helper.main_program
+            self._parent_block_cache = prog.block(
+                prog.current_block().parent_idx)
+            try:
+                yield
+                increment(x=self.step_idx, value=1.0, in_place=True)
+
+                self._write_step_arrays_(self.mem_link)
+
+                less_than(
+                    x=self.step_idx,
+                    y=self.max_seq_len,
+                    force_cpu=True,
+                    cond=self.cond)
+            finally:
+                self._parent_block_cache = None
 
         self.status = DynamicRNN.AFTER_RNN
         for each_array in self.output_array:
@@ -1467,7 +1487,7 @@ class DynamicRNN(object):
                 init_tensor = init_reordered
             mem_array = parent_block.create_var(
                 name=unique_name.generate('dynamic_rnn_mem_array'),
-                type=core.VarDesc.VarType.LOD_TENSOR_ARRAY,
+                type=_LOD_TENSOR_ARRAY,
                 dtype=init.dtype)
             parent_block.append_op(
                 type='write_to_array',
@@ -1477,7 +1497,8 @@ class DynamicRNN(object):
             retv = array_read(array=mem_array, i=self.step_idx)
             retv = shrink_memory(
                 x=retv, i=self.step_idx, table=self.lod_rank_table)
-            self.mem_dict[retv.name] = mem_array
+            # remember the array on the memory itself, tagged with its owner
+            retv._dyn_rnn_memory = (self, mem_array)
             return retv
         else:
             if len(self.input_array) == 0:
@@ -1515,8 +1536,8 @@ class DynamicRNN(object):
             raise TypeError("The input arg `new_mem` of update_memory() must "
                             "be a Variable")
 
-        mem_array = self.mem_dict.get(ex_mem.name, None)
-        if mem_array is None:
+        owner, mem_array = getattr(ex_mem, '_dyn_rnn_memory', (None, None))
+        if owner is not self:
             raise ValueError("Please invoke memory before update_memory")
         if self.lod_rank_table is None:
             raise ValueError("Please invoke step_input before update_memory")
@@ -1526,16 +1547,29 @@ class DynamicRNN(object):
     def output(self, *outputs):
         self._assert_in_rnn_block_('output')
         parent_block = self._parent_block_()
-        for each in outputs:
-            outside_array = parent_block.create_var(
-                name=unique_name.generate("_".join(
-                    [self.helper.name, "output_array", each.name])),
-                type=core.VarDesc.VarType.LOD_TENSOR_ARRAY,
-                dtype=each.dtype)
-            array_write(x=each, i=self.step_idx, array=outside_array)
-            self.output_array.append(outside_array)
+        prefix = "_".join([self.helper.name, "output_array", ""])
+        outside_arrays = [
+            parent_block.create_var(
+                name=unique_name.generate(prefix + each.name),
+                type=_LOD_TENSOR_ARRAY,
+                dtype=each.dtype) for each in outputs
+        ]
+        self._write_step_arrays_(zip(outputs, outside_arrays))
+        self.output_array.extend(outside_arrays)
+
+    def _write_step_arrays_(self, pairs):
+        """Append a write_to_array of each x at the current step index."""
+        block = self.helper.main_program.current_block()
+        for x, array in pairs:
+            block.append_op(
+                type='write_to_array',
+                inputs={'X': [x],
+                        'I': [self.step_idx]},
+                outputs={'Out': [array]})
 
     def _parent_block_(self):
+        if self._parent_block_cache is not None:
+            return self._parent_block_cache
         prog = self.helper.main_program
         parent_idx = prog.current_block().parent_idx
         assert parent_idx >= 0
@@ -1551,14 +1585,13 @@ class DynamicRNN(object):
 
 @autodoc()
 def reorder_lod_tensor_by_rank(x, rank_table):
-    helper = LayerHelper('reorder_lod_tensor_by_rank', **locals())
-    helper.is_instance('x', Variable)
-    helper.is_instance('rank_table', Variable)
+    if not isinstance(x, Variable) or not isinstance(rank_table, Variable):
+        raise TypeError("reorder_lod_tensor_by_rank takes Variables")
 
-    out = helper.create_tmp_variable(dtype=x.dtype)
-    helper.append_op(
+    outputs = _simple_append_op(
         type='reorder_lod_tensor_by_rank',
         inputs={'X': [x],
                 'RankTable': [rank_table]},
-        outputs={'Out': [out]})
-    return out
+        outputs={'Out': None},
+        out_dtype=x.dtype)
+    return outputs['Out']
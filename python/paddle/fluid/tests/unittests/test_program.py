@@ -50,6 +50,27 @@ class TestProgram(unittest.TestCase):
         self.assertEqual(1, b.idx)
         self.assertEqual(0, b.parent_idx)
 
+    def test_vars_recursive(self):
+        prog = Program()
+        x = prog.global_block().create_var(name='X', dtype='float32')
+        prog.global_block().create_var(name='Y', dtype='float32')
+        sub_block = prog.create_block()
+        y = sub_block.create_var(name='Y', dtype='float32')
+        z = sub_block.create_var(name='Z', dtype='float32')
+        inner_block = prog.create_block()
+
+        self.assertEqual([z, x, y], inner_block.vars_recursive(['Z', 'X', 'Y']))
+        self.assertRaises(ValueError, inner_block.vars_recursive, ['X', 'W'])
+
+    def test_vars_by_names(self):
+        prog = Program()
+        x = prog.global_block().create_var(name='X', dtype='float32')
+        y = prog.global_block().create_var(name='Y', dtype='float32')
+        sub_block = prog.create_block()
+
+        self.assertEqual([y, x], prog.global_block().vars_by_names(['Y', 'X']))
+        self.assertRaises(ValueError, sub_block.vars_by_names, ['X'])
+
     def test_program_clone(self):
         prog = Program()
 
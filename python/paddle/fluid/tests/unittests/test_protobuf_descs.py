@@ -209,6 +209,24 @@ class TestBlockDesc(unittest.TestCase):
             all_ops.append(block.op(idx))
         self.assertEqual(all_ops, [op0, op2])
 
+    def test_collect_free_vars(self):
+        program_desc = core.ProgramDesc()
+        block = program_desc.block(0)
+
+        op0 = block.append_op()
+        op0.set_type("test")
+        op0.set_input("X", ["x", "w"])
+        op0.set_output("Out", ["h"])
+        op1 = block.append_op()
+        op1.set_type("test")
+        op1.set_input("X", ["h", "w", "b", "y"])
+        op1.set_output("Out", ["y"])
+
+        self.assertEqual(block.collect_free_vars(["x"], True), ["w", "b", "y"])
+        self.assertEqual(block.collect_free_vars(["x"], False), ["w", "b"])
+        self.assertEqual(
+            block.collect_free_vars([], True), ["x", "w", "b", "y"])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -15,7 +15,7 @@
 import unittest
 
 import paddle.fluid.layers as layers
-from paddle.fluid.framework import Program, grad_var_name
+from paddle.fluid.framework import Program, grad_var_name, program_guard
 from paddle.fluid.executor import Executor
 from paddle.fluid.backward import append_backward
 import numpy as np
@@ -467,5 +467,77 @@ class RecurrentOpNoMemBootTest(RecurrentOpTest1):
         return rnn()
 
 
+class StaticRNNSharedMemoryUpdateBackwardTest(unittest.TestCase):
+    """
+    Two memories updated with the same variable must still get a
+    gradient that backward can sum.
+    """
+
+    def build_rnn(self):
+        x = layers.data(
+            name='x', shape=[2, 1, 2], dtype='float32', append_batch_size=False)
+        boot1 = layers.data(
+            name='boot1',
+            shape=[1, 2],
+            dtype='float32',
+            append_batch_size=False)
+        boot2 = layers.data(
+            name='boot2',
+            shape=[1, 2],
+            dtype='float32',
+            append_batch_size=False)
+        for var in (x, boot1, boot2):
+            var.stop_gradient = False
+
+        rnn = layers.StaticRNN()
+        with rnn.step():
+            pre1 = rnn.memory(init=boot1)
+            pre2 = rnn.memory(init=boot2)
+            x_t = rnn.step_input(x)
+            h = layers.sums(input=[x_t, pre1, pre2])
+            rnn.update_memory(pre1, h)
+            rnn.update_memory(pre2, h)
+            rnn.output(h)
+        return layers.mean(rnn())
+
+    def test_backward(self):
+        program = Program()
+        with program_guard(program, Program()):
+            loss = self.build_rnn()
+            append_backward(loss)
+
+        for block in program.blocks:
+            produced = set()
+            for op in block.ops:
+                if op.type == 'rnn_memory_helper':
+                    names = op.input('X')
+                    self.assertEqual(len(names), len(set(names)))
+                if op.type == 'sum':
+                    for name in op.input_arg_names:
+                        if '@RENAME@' in name:
+                            self.assertIn(name, produced)
+                produced.update(op.output_arg_names)
+
+
+class StaticRNNRepeatedOutputBackwardTest(
+        StaticRNNSharedMemoryUpdateBackwardTest):
+    """
+    The same variable given twice to one output() call must still get a
+    gradient that backward can sum.
+    """
+
+    def build_rnn(self):
+        x = layers.data(
+            name='x', shape=[2, 1, 2], dtype='float32', append_batch_size=False)
+        x.stop_gradient = False
+
+        rnn = layers.StaticRNN()
+        with rnn.step():
+            x_t = rnn.step_input(x)
+            h = layers.scale(x=x_t, scale=2.0)
+            rnn.output(h, h)
+        return layers.mean(layers.sums(input=rnn()))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -47,6 +47,41 @@ class RNNMemoryHelperOpTest(unittest.TestCase):
         self.assertTrue(np.allclose(out[0], x_np, rtol=1e-5))
 
 
+class RNNMemoryHelperMultipleMemoriesOpTest(unittest.TestCase):
+    def setUp(self):
+        self.program = Program()
+        self.place = core.CPUPlace()
+
+        block = self.program.global_block()
+        self.X = [
+            block.create_var(
+                name='X%d' % i, shape=[2, 3], dtype='float32')
+            for i in range(3)
+        ]
+        self.Out = [
+            block.create_var(
+                name='Out%d' % i, shape=[2, 3], dtype='float32')
+            for i in range(3)
+        ]
+        block.append_op(
+            type='rnn_memory_helper',
+            inputs={"X": self.X},
+            outputs={"Out": self.Out},
+            attrs={})
+
+    def test_forward(self):
+        self.feed_map = {
+            x.name: np.random.normal(size=(2, 3)).astype("float32")
+            for x in self.X
+        }
+        exe = Executor(self.place)
+        outs = exe.run(self.program,
+                       feed=self.feed_map,
+                       fetch_list=self.Out)
+        for x, out in zip(self.X, outs):
+            self.assertTrue(np.allclose(out, self.feed_map[x.name], rtol=1e-5))
+
+
 class RNNMemoryHelperGradOpTest(unittest.TestCase):
     def setUp(self):
         self.program = Program()
@@ -131,5 +166,85 @@ class RNNMemoryHelperGradOpWithoutInputTest(unittest.TestCase):
                 out[0], np.zeros(shape=(2, 3)).astype("float32"), rtol=1e-5))
 
 
+class RNNMemoryHelperMultipleGradOpTest(unittest.TestCase):
+    def setUp(self):
+        self.program = Program()
+        self.fake_program = Program()
+        self.place = core.CPUPlace()
+
+        block = self.program.global_block()
+
+        def create_vars(block, fmt):
+            return [
+                block.create_var(
+                    name=fmt % i, shape=[2, 3], dtype='float32')
+                for i in range(3)
+            ]
+
+        self.X = create_vars(block, 'X%d')
+        self.Out = create_vars(block, 'Out%d')
+        # Out2@GRAD is missing from the scope, so X2@GRAD is zero-filled
+        self.Out_grad = create_vars(block, 'Out%d@GRAD')[:2] + \
+            create_vars(self.fake_program.global_block(), 'Out%d@GRAD')[2:]
+        # X1 is in the no grad set
+        self.X_grad = create_vars(block, 'X%d@GRAD')
+        self.X_grad[1] = block.create_var(
+            name=core.empty_var_name(), shape=[2, 3], dtype='float32')
+
+        block.append_op(
+            type='rnn_memory_helper_grad',
+            inputs={
+                'X': self.X,
+                'Out': self.Out,
+                'Out@GRAD': self.Out_grad
+            },
+            outputs={'X@GRAD': self.X_grad},
+            attrs={})
+
+    def test_backward(self):
+        self.feed_map = {
+            var.name: np.random.normal(size=(2, 3)).astype("float32")
+            for var in self.X + self.Out_grad[:2]
+        }
+        self.fetch_list = [self.X_grad[0], self.X_grad[2]]
+
+        exe = Executor(self.place)
+        outs = exe.run(self.program,
+                       feed=self.feed_map,
+                       fetch_list=self.fetch_list)
+        self.assertTrue(
+            np.allclose(
+                outs[0], self.feed_map['Out0@GRAD'], rtol=1e-5))
+        self.assertTrue(
+            np.allclose(
+                outs[1], np.zeros(shape=(2, 3)).astype("float32"), rtol=1e-5))
+
+
+class RNNMemoryHelperGradOpSizeMismatchTest(unittest.TestCase):
+    def test_backward(self):
+        program = Program()
+        block = program.global_block()
+
+        def var(name):
+            return block.create_var(name=name, shape=[2, 3], dtype='float32')
+
+        block.append_op(
+            type='rnn_memory_helper_grad',
+            inputs={
+                'X': [var('X0'), var('X1')],
+                'Out': [var('Out0'), var('Out1')],
+                'Out@GRAD': [var('Out0@GRAD')]
+            },
+            outputs={'X@GRAD': [var('X0@GRAD'), var('X1@GRAD')]},
+            attrs={})
+
+        feed_map = {
+            name: np.random.normal(size=(2, 3)).astype("float32")
+            for name in ['X0', 'X1', 'Out0@GRAD']
+        }
+        exe = Executor(core.CPUPlace())
+        self.assertRaises(core.EnforceNotMet, exe.run, program, feed=feed_map)
+
+
 if __name__ == '__main__':
     unittest.main()
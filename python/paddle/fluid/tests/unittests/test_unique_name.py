@@ -41,3 +41,10 @@ class TestUniqueName(unittest.TestCase):
             name3 = fluid.unique_name.generate('tmp')
             self.assertNotEqual(name1, name2)
             self.assertEqual(name1[-2:], name3[-2:])
+
+    def test_generate_batch(self):
+        with fluid.unique_name.guard():
+            names = fluid.unique_name.generate_batch('fc', 3)
+            self.assertEqual(['fc_0', 'fc_1', 'fc_2'], names)
+            self.assertEqual('fc_3', fluid.unique_name.generate('fc'))
+            self.assertEqual([], fluid.unique_name.generate_batch('fc', 0))
@@ -16,7 +16,9 @@ import collections
 import contextlib
 import sys
 
-__all__ = ['generate', 'switch', 'guard', 'UniqueNameGenerator']
+__all__ = [
+    'generate', 'generate_batch', 'switch', 'guard', 'UniqueNameGenerator'
+]
 
 
 class UniqueNameGenerator(object):
@@ -47,6 +49,22 @@ class UniqueNameGenerator(object):
         self.ids[key] += 1
         return self.prefix + "_".join([key, str(tmp)])
 
+    def generate_batch(self, key, num):
+        """
+        Generate several unique names with the same key at once
+
+        Args:
+            key(str): The key of return strings.
+            num(int): The number of names to generate.
+
+        Returns(list): `num` unique strings with the prefix, the same as
+            calling this generator `num` times.
+        """
+        start = self.ids[key]
+        self.ids[key] = start + num
+        head = self.prefix + key + "_"
+        return [head + str(i) for i in range(start, start + num)]
+
 
 generator = UniqueNameGenerator()
 
@@ -55,6 +73,10 @@ def generate(key):
     return generator(key)
 
 
+def generate_batch(key, num):
+    return generator.generate_batch(key, num)
+
+
 def switch(new_generator=None):
     global generator
     old = generator